@@ -26,6 +26,13 @@ Usage:
 			  python openscad_offliner.py 
 		All web pages will be saved in x/openscad_docs, 
 		and all images in x/openscad_docs/imgs  
+		3) python openscad_offliner.py status|verify
+		   reports on / checks the files of a previous crawl.
+		   See python openscad_offliner.py --help for the other options.
+		4) Or from python:
+
+			  from openscad_offliner import Crawler
+			  Crawler(output_dir='docs', max_depth=2).crawl()
 
 Note: 
 
@@ -47,17 +54,21 @@ git: https://github.com/runsun/openscad_offliner
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
 import errno
 import logging
 import os
 import pickle
+import sys
 import time
-import urllib
-from collections import defaultdict
-from os import walk
+import urllib.error
+import urllib.parse
+from collections import deque
 from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup as bs
+# NOTE: BeautifulSoup and urllib.request (http.client, ssl, ...) are only
+# imported once a crawl actually starts, so that importing this module, or
+# running the status/verify commands, stays cheap.
 
 cheatsheet_url = "https://www.openscad.org/cheatsheet/index"
 
@@ -68,61 +79,30 @@ HAMMERTIME = False
 # taken from https://github.com/runsun/openscad_offliner/blob/master/openscad_offliner.py
 this_dir = os.path.dirname(os.path.abspath(__file__))
 dir_docs = 'openscad_docs'
-dir_imgs = os.path.join(dir_docs, 'imgs')
 dir_styles = 'styles'
-dir_styles_full = os.path.join(dir_docs, 'styles')
 offline_cheatsheet = 'openscad_offline_cheatsheet.html'
+buffers_name = 'buffers.txt'
 
 url_openscadorg = 'https://www.openscad.org'
 url_wiki = 'https://en.wikibooks.org'
 url_openscadwiki = '/wiki/OpenSCAD_User_Manual'
 url_offliner = 'https://github.com/ixil/openscad_offliner'
-if not os.path.exists(dir_docs): os.makedirs(dir_docs)
-if not os.path.exists(dir_imgs): os.makedirs(dir_imgs)
-if not os.path.exists(dir_styles_full): os.makedirs(dir_styles_full)
-
-print("\n[Local]")
-print("this_dir= " + this_dir)
-print("dir_docs= " + dir_docs)
-print("dir_imgs= " + dir_imgs)
-print("dir_styles= " + dir_styles)
-print("dir_styles_full= " + dir_styles_full)
-print("cheatsheet page= " + offline_cheatsheet)
-print()
-
-#
-# Buffer to keep track of downloaded to avoid repeating downloads
-#
-pages = []  # Urls of downloaded pages
-imgs = []  # Local paths of downloaded images
-styles = []  # stylesheet urls
-
-
-def populate(buffer_fp=os.path.join(dir_docs, 'buffers.txt')):
-    ''' This is mostly useless as it will not work unless the program has finished to completion -
-    and appending write-line style would be better.'''
-    with open(buffer_fp, 'wb+') as f:
-        pickle.dump({'pages': pages, 'imgs': imgs, 'styles': styles}, f)
-        logger.info("writing buffers out")
-
-
-def prepopulate(buffer_fp=os.path.join(dir_docs, 'buffers.txt')):
-    ''' This is mostly useless as we do not reparse the files at all.'''
-    try:
-        with open(buffer_fp, 'rb') as fp:
-            buffers = pickle.load(fp)
 
-        pages.extend(buffers['pages'])
-        imgs.extend(buffers['imgs'])
-        styles.extend(buffers['styles'])
-    except FileNotFoundError:
-        pass
+
+def bs(*args, **kwargs):
+    ''' BeautifulSoup, imported on first use '''
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(*args, **kwargs)
 
 
-if HAMMERTIME is False:
-    '''We check the existing files so that we don\'t have to hammer the servers so much'''
-    prepopulate()
-    logger.info("Prepopulated the list")
+def page_filename(url):
+    ''' Local file name a page url is saved under '''
+    return url.split("/")[-1].split("#")[0] + ".html"
+
+
+def page_url(url):
+    ''' Complete url, without #fragment, a page is fetched from and recorded under in pages '''
+    return urllib.parse.urldefrag(sureUrl(urlparse(url).netloc, url))[0]
 
 
 def sureUrl(baseurl, url):
@@ -169,150 +149,6 @@ def sureUrl(baseurl, url):
     return url_parts.geturl()
 
 
-'''
-All style files will be saved as style_?.css where ? is an integer.
-Two kind of styles need to be handled:
-1) linked_style:
-        loaded by <link href="..../load.php...">
-        They are handled by download_style_from_link_tag( soup_link, ind )
-        whenever necessary.
-2) mported_style
-        loaded by a line in a style file (that could be a linked_style):
-                @import url(...) screen;
-        This is handled by download_imported_style( csstext, ind )
-Note: Maybe a class like: StyleReader is good for this ?
-'''
-
-
-def handle_styles(baseurl, soup, ind):
-
-    for link in soup.find_all('link'):
-
-        # href = link.get('href')
-        if baseurl != cheatsheet_url:
-            href = sureUrl(baseurl, link.get('href'))
-        else:
-            href = sureUrl(baseurl, link.get('href'))
-
-        # if not href.startswith( url_wiki ):
-        #  href = os.path.join( url_wiki, href)
-
-        if '/load.php?' in href:
-            download_style_from_link_tag(baseurl, soup_link=link, ind=ind)
-        elif baseurl == cheatsheet_url:
-            download_style_from_link_tag(baseurl, soup_link=link, ind=ind)
-        else:
-            del link['href']
-
-
-def download_style_from_link_tag(baseurl, soup_link, ind):
-    '''
-    Download/save/redirect style loaded with <link href="..../load.php...">
-    '''
-
-    link = soup_link
-    ind = ind + "# "
-    href = sureUrl(baseurl, link['href'])
-    logger.debug("{}: Found existing: {} href".format(ind, href))
-    if href:
-
-        # if href.startswith('//'):
-        #    href = 'https:' + href
-
-        try:
-            (stylename, redirect_path) = download_style(baseurl, url=href, ind=ind)
-            # NOTE: the redirect_path return by download_style needs to be
-            # prepended with a "styles". This is different from the
-            # case of download_imported_style
-            redirect_path = os.path.join("styles", redirect_path)
-
-            logger.debug("Redirect link's style path to: " + redirect_path)
-            link['href'] = redirect_path
-        except urllib.error.HTTPError:
-            pass
-
-
-
-def download_imported_style(baseurl, csstext, ind):
-    '''
-    Download/save style that is originally imported by a css file. The url
-                in the "@import url(...)" is redirected to saved file. Return modified csstext.
-    '''
-
-    # It turns out that the only css file having imports is with a <link>:
-    ##
-    # https://en.wikibooks.org/w/load.php?debug=false&lang=en&modules=site&only=styles&skin=vector&*
-    ##
-    # Its css file contains several lines like this:
-    ##
-    # @import url(//en.wikibooks.org/w/index.php?title=MediaWiki:Common.css/Autocount.css&action=raw&ctype=text/css) screen;
-    ##
-    # We will extract the url in all @import and save them as style_?.css
-
-    lines = csstext.split(';')
-    for i, ln in enumerate(lines):
-
-        if ln.startswith('@import'):
-
-            logger.debug("{}: @import css line found at line #{}".format(ind, i))
-            ln = ln.split('(')
-            ln = [ln[0], ln[1].split(')')[0], ln[1].split(')')[1]]
-            url = 'https:' + ln[1]
-            (stylename, redirect_path) = download_style(baseurl, url, ind)
-
-            logger.debug("Redirect imported style to " + redirect_path)
-            lines[i] = ln[0] + '(' + redirect_path + ')' + ln[-1]
-
-        return ';\n'.join(lines)
-
-def download_style(baseurl, url, ind):
-    '''
-    Download style and update styles buffer. Return (style filename, redirect_path)
-    '''
-
-    #    if not url.startswith( url_wiki ):
-    #      print(ind + ':: url not starts with url_wiki("%s"), changing it...'%url_wiki)
-    #      url = urllib.parse.urljoin( url_wiki, url[0]=="/" and url[1:] or url)
-    #      print(ind + ':: New url = '+ url[:20] + '...')
-    url = sureUrl(baseurl, url)
-
-    if url in styles:
-        i = styles.index(url)
-        stylename = "style_%s.css" % i
-        logger.debug("{} already downloaded as {}".format(url, stylename))
-
-    else:
-        i = len(styles)
-
-        # IMPORTANT: append to styles right after i is retrieved
-        styles.append(url)
-
-        stylename = "style_%s.css" % i
-        logger.info("Downloading style {} as {}".format(url, stylename))
-
-        try:
-            response = urllib.request.urlopen(url)
-        except urllib.error.HTTPError as e:
-            logger.warning(e)
-            logger.warning("Missing style: {}".format(url))
-            raise e
-
-        # styletext = response.read().decode()
-        try:
-            styletext = response.read().decode(response.headers.get_content_charset())
-            styletext = download_imported_style(baseurl, styletext, ind)
-            save_style(stylename, styletext, ind)
-        except TypeError:
-            # No content_charset
-            logger.warning("Treating link as 'style': saving {} to {}".format(url, stylename))
-            path = os.path.join(dir_docs, dir_styles, stylename)
-            blob = response.read()
-            save_blob(path, blob)
-
-    redirect_path = os.path.join('.', stylename)
-    return (stylename, redirect_path)
-
-
 def save_blob(path, blob):
     logger.debug("Saving blob to: {}".format(path))
     try:
@@ -327,24 +163,6 @@ def save_blob(path, blob):
         else:
             raise  # re-raise previously caught exception
 
-def save_style(stylename, styletext, ind):
-    '''
-    Called by download_style()
-    '''
-    path = os.path.join(dir_docs, dir_styles, stylename)
-    logger.debug("{}: Saving style to: {}".format(ind, path))
-    try:
-        open(path, "x").write(styletext)
-    except FileExistsError:
-        logger.warning("File exists! appending {}".format(path))
-        open(path, "w+").write(styletext)
-    except OSError as exc:
-        if exc.errno == errno.ENAMETOOLONG:
-            logger.error("Filename too long! Ignoring {}".format(path))
-
-        else:
-            raise  # re-raise previously caught exception
-
 
 def append_style(soup, local_style_path, ind):
     '''
@@ -386,151 +204,6 @@ def handle_scripts(soup, ind):
         logger.debug("Cleared script.")
 
 
-# ========================================================
-##
-# tag <a...> (Note: imgs are handled within <a>)
-##
-# Go thru each <a>, load page or img as needed
-# ========================================================
-
-
-def handle_tagAs(baseurl, soup, ind):
-
-    # print(ind + '>>> handle_tagAs(soup)')
-    for a in soup.find_all('a'):
-        href = a.get('href')
-        '''
-        href could be:
-        https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/First_Steps
-        https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/First_Steps/Creating_a_simple_model
-
-        But we save all pages in the folder where the home page is anyway.
-        '''
-
-        if a.string == 'edit':  # Remove [<a...>edit</a>]
-            a.findParents()[0].clear()
-
-        if href:
-            href_parts = urlparse(href)
-            # if href_parts.netloc == url_wiki and href_parts.path.startswith(url_openscadwiki):
-            # if href.startswith(url_wiki + url_openscadwiki):
-            #     href = href[len(url_wiki):]
-
-            # Note we compare with the the WIKIPATH and the openscadorg NETLOC
-            starts_with_wiki = href_parts.path.startswith(urlparse(url_openscadwiki).path)
-            starts_with_openscadorg = (href_parts.netloc == urlparse(url_openscadorg).netloc)
-            if (starts_with_wiki or starts_with_openscadorg):
-
-                # like: aaa#bbb=> [aaa,bbb]
-                fnames = href.split("/")[-1].split("#")  # like: aaa#bbb=> [aaa,bbb]
-                fname  = fnames[0] + ".html"
-                fnamebranch = fname + (len(fnames) > 1 and ("#" + fnames[1]) or "")
-
-                if not fname == 'Print_version.html':
-
-                    handle_page(url=href, indent=len(ind))
-                    a['href'] = fnamebranch
-                    logger.info("{}: Pages: {} -  handle_tagAs saving page {}. New href = {}".format(ind, len(pages), os.path.join(dir_docs, fname), a.get('href')))
-
-            # hopefully already covered in sameUrl
-            # elif href_parts.path.startswith('/wiki'):
-            #     a['href'] = url_wiki + href
-            elif href.startswith('//'):
-                a['href'] = 'https:' + href
-
-            if a.img and not a.img['src'].startswith('/static/images'):
-                # FIXME should do better inspection of the links to handle svg
-# All imgs are wrapped inside <a>, so download_img() is called when handling <a> (handle_tagAs)
-
-                try:
-                    imgname = download_img(baseurl, soup_a=a, ind=ind)
-                    redirect_img(a, imgname, ind)
-                except urllib.error.HTTPError:
-                    pass
-                except OSError as exc:
-                    if exc.errno == errno.ENAMETOOLONG:
-                        logger.error("Unable to save the image. ignoring")
-                    else:
-                        raise
-    return soup
-
-
-def download_img(baseurl, soup_a, ind):
-    '''
-    Download an image in <a...><img ...></a>. Return imgname
-                soup_a: a BeautifulSoup tag class
-                ind   : indent for logger
-    '''
-
-    # print(ind + '>>> download_img(soup_a)')
-    src = sureUrl(baseurl, soup_a.img['src'])
-    #    if src.startswith('//'):
-    #       src = "https:" + src
-    #    elif not src.startswith( url_wiki):
-    #      src = urllib.parse.urljoin( url_wiki, src)
-
-    imgname = src.split("/")[-1]
-
-    # Decode url:
-    #  Some img name contains %28,%29 for "(",")", resp, and %25 for %.
-    imgname = imgname.replace('%28', '(').replace('%29', ')').replace('%25', '%')
-
-    logger.debug("{}:  Img src: {}".format(ind, src))
-
-    savepath = os.path.join(dir_imgs, imgname)  # local img path
-    if savepath not in imgs:
-
-        logger.info("Downloading image: " + imgname)
-        try:
-            try:
-                with open(savepath, 'x'):
-                    pass
-            except FileExistsError:
-                logger.error("File exists, Overwriting... {}".format(savepath))
-
-            urllib.request.urlretrieve(src, savepath)  # download image
-            imgs.append(savepath)
-            logger.debug(ind + "Saved img as: " + savepath)
-        except urllib.error.HTTPError as e:
-            logger.warning("404 image: {}".format(src))
-            raise e
-        except OSError as exc:
-            if exc.errno == errno.ENAMETOOLONG:
-                logger.error("Filename too long! Ignoring... {}".format(imgname))
-                imgs.append(savepath) # no point in retrying later on either
-            # TODO 
-            # this currently occurs due to the build notification icon etc actually being a link to
-            # an svg file hosted on github - at least on my machine ... ?
-            else:
-                raise  # re-raise previously caught exception
-
-
-# Remove srcset that seems to cause problem in some Firefox
-    del soup_a.img['srcset']
-
-    # For debug:
-    # print(ind+ "a.img: "+str(a))
-
-    return imgname
-
-
-def redirect_img(soup_a, imgname, ind):
-    '''
-    Redirect img src links in soup_a (<a...><img ...></a>) to local path.
-
-                soup_a: a BeautifulSoup tag class
-                ind   : indent for logger
-    '''
-    linkurl = os.path.join('.', 'imgs', imgname)  # ./imgs/img.png
-    logger.debug("Img links redirect to: " + linkurl)
-    soup_a.img['src'] = linkurl
-    soup_a['href'] = linkurl
-    logger.debug("Total imgs: " + str(len(imgs)))
-
-    # For debug:
-    # print(ind+ "a.img: "+str(a))
-
-
 # ========================================================
 ##
 # misc
@@ -597,68 +270,576 @@ def removeNonOpenSCAD(soup, url):
         # soup.body.clear() # FIXME maybe we shouldn't destroy everything based on this test...
 
 
+
+
 # ========================================================
 ##
-# html page --- this is the main function
+# Crawler
 ##
 # ========================================================
 
 
-def handle_page(url, folder=dir_docs, indent=0):
+class Crawler(object):
+    '''
+    Crawl the OpenSCAD docs starting from seed_urls and save them under
+    output_dir. All crawl state (the pages/imgs/styles buffers) lives on the
+    instance, so several crawls with different settings can be run from
+    one process.
+
+        seed_urls    : pages to start the crawl from (default: the cheatsheet)
+        output_dir   : where pages are saved; imgs/ and styles/ go below it
+        scope_paths  : <a> hrefs whose path starts with one of these are followed
+        scope_netlocs: <a> hrefs on one of these hosts are followed
+        max_depth    : how many links away from a seed to follow (None: no limit)
+        resume       : reload the buffers of a previous run so that we don't
+                       hammer the servers so much
+    '''
 
-    # For logger
-    ind = '[' + str(len(pages) + 1) + '] '
-    indm = ind + "| "  # for image
+    def __init__(self, seed_urls=(cheatsheet_url,), output_dir=dir_docs,
+                 scope_paths=(url_openscadwiki,),
+                 scope_netlocs=(urlparse(url_openscadorg).netloc,),
+                 max_depth=None, resume=not HAMMERTIME):
+
+        self.seed_urls = list(seed_urls)
+        self.dir_docs = output_dir
+        self.dir_imgs = os.path.join(output_dir, 'imgs')
+        self.dir_styles_full = os.path.join(output_dir, dir_styles)
+        self.buffer_fp = os.path.join(output_dir, buffers_name)
+        self.scope_paths = tuple(scope_paths)
+        self.scope_netlocs = tuple(scope_netlocs)
+        self.max_depth = max_depth
+        self.resume = resume
+
+        #
+        # Buffer to keep track of downloaded to avoid repeating downloads
+        #
+        self.pages = []  # Urls of downloaded pages
+        self.imgs = []  # Local paths of downloaded images
+        self.styles = []  # stylesheet urls
+        self.failed = []  # Local paths recorded above that could not be saved
+
+        # Pages found but not fetched yet, as (url, depth). Crawled breadth
+        # first so that every page is reached at its smallest depth.
+        self.queue = deque()
+        self.queued = set()
+
+    def crawl(self):
+        '''
+        Crawl every seed url, then write the buffers out
+        '''
+        for d in (self.dir_docs, self.dir_imgs, self.dir_styles_full):
+            if not os.path.exists(d): os.makedirs(d)
 
-    logger.debug("{} handle_page(url='{}', folder='{}')".format(ind, url, folder))
-    # print ind+ 'Page: ' + href
+        if self.resume:
+            self.prepopulate()
+            logger.info("Prepopulated the list")
+        else:
+            for buffer in (self.pages, self.imgs, self.styles, self.failed):
+                buffer[:] = []
+
+        self.queue.clear()
+        self.queued.clear()
+        for url in self.seed_urls:
+            self.enqueue(url, depth=0)
+        while self.queue:
+            url, depth = self.queue.popleft()
+            self.handle_page(url=url, depth=depth)
+        self.populate()
+
+    def enqueue(self, url, depth):
+        '''
+        Queue the page at url for handle_page() unless it is already saved or queued
+        '''
+        url = page_url(url)
+        if url not in self.pages and url not in self.queued:
+            self.queued.add(url)
+            self.queue.append((url, depth))
+
+    def populate(self):
+        ''' This is mostly useless as it will not work unless the program has finished to completion -
+        and appending write-line style would be better.'''
+        with open(self.buffer_fp, 'wb+') as f:
+            pickle.dump({'pages': self.pages, 'imgs': self.imgs, 'styles': self.styles,
+                         'failed': self.failed}, f)
+            logger.info("writing buffers out")
+
+    def load_buffers(self):
+        '''
+        Return the {'pages': [], 'imgs': [], 'styles': [], 'failed': []} buffers
+        written by the last crawl
+        '''
+        buffers = {'pages': [], 'imgs': [], 'styles': [], 'failed': []}
+        try:
+            with open(self.buffer_fp, 'rb') as fp:
+                buffers.update(pickle.load(fp))
+        except FileNotFoundError:
+            pass
+        return buffers
+
+    def prepopulate(self):
+        ''' This is mostly useless as we do not reparse the files at all.'''
+        buffers = self.load_buffers()
+        self.pages[:] = buffers['pages']
+        self.imgs[:] = buffers['imgs']
+        self.styles[:] = buffers['styles']
+        self.failed[:] = buffers['failed']
+
+    def status(self):
+        '''
+        Return {'pages': n, 'imgs': n, 'styles': n} as recorded by the last crawl
+        '''
+        buffers = self.load_buffers()
+        return {k: len(buffers[k]) for k in ('pages', 'imgs', 'styles')}
+
+    def verify(self):
+        '''
+        Return the local paths recorded by the last crawl that are missing on disk,
+        leaving out the ones it already failed to save
+        '''
+        buffers = self.load_buffers()
+        paths = [os.path.join(self.dir_docs, page_filename(url)) for url in buffers['pages']]
+        paths += [os.path.join(self.dir_imgs, os.path.basename(p)) for p in buffers['imgs']]
+        paths += [os.path.join(self.dir_styles_full, "style_%s.css" % i)
+                  for i in range(len(buffers['styles']))]
+        return [p for p in paths if p not in buffers['failed'] and not os.path.exists(p)]
+
+    def in_scope(self, href):
+        '''
+        True if the page at href should be crawled
+        '''
+        href_parts = urlparse(href)
+        # Note we compare with the the WIKIPATH and the openscadorg NETLOC
+        return (href_parts.path.startswith(self.scope_paths) or
+                href_parts.netloc in self.scope_netlocs)
+
+    '''
+    All style files will be saved as style_?.css where ? is an integer.
+    Two kind of styles need to be handled:
+    1) linked_style:
+            loaded by <link href="..../load.php...">
+            They are handled by download_style_from_link_tag( soup_link, ind )
+            whenever necessary.
+    2) mported_style
+            loaded by a line in a style file (that could be a linked_style):
+                    @import url(...) screen;
+            This is handled by download_imported_style( csstext, ind )
+    Note: Maybe a class like: StyleReader is good for this ?
+    '''
 
-    parts = urllib.parse.urlparse(url)
-    baseurl = parts.netloc
-    url = sureUrl(baseurl, url)
+    def handle_styles(self, baseurl, soup, ind):
 
-    if url not in pages:  # url not already downloaded
+        for link in soup.find_all('link'):
+
+            # href = link.get('href')
+            if baseurl != cheatsheet_url:
+                href = sureUrl(baseurl, link.get('href'))
+            else:
+                href = sureUrl(baseurl, link.get('href'))
+
+            # if not href.startswith( url_wiki ):
+            #  href = os.path.join( url_wiki, href)
+
+            if '/load.php?' in href:
+                self.download_style_from_link_tag(baseurl, soup_link=link, ind=ind)
+            elif baseurl == cheatsheet_url:
+                self.download_style_from_link_tag(baseurl, soup_link=link, ind=ind)
+            else:
+                del link['href']
+
+    def download_style_from_link_tag(self, baseurl, soup_link, ind):
+        '''
+        Download/save/redirect style loaded with <link href="..../load.php...">
+        '''
+
+        link = soup_link
+        ind = ind + "# "
+        href = sureUrl(baseurl, link['href'])
+        logger.debug("{}: Found existing: {} href".format(ind, href))
+        if href:
+
+            # if href.startswith('//'):
+            #    href = 'https:' + href
+
+            try:
+                (stylename, redirect_path) = self.download_style(baseurl, url=href, ind=ind)
+                # NOTE: the redirect_path return by download_style needs to be
+                # prepended with a "styles". This is different from the
+                # case of download_imported_style
+                redirect_path = os.path.join("styles", redirect_path)
+
+                logger.debug("Redirect link's style path to: " + redirect_path)
+                link['href'] = redirect_path
+            except urllib.error.HTTPError:
+                pass
+
+    def download_imported_style(self, baseurl, csstext, ind):
+        '''
+        Download/save style that is originally imported by a css file. The url
+                    in the "@import url(...)" is redirected to saved file. Return modified csstext.
+        '''
+
+        # It turns out that the only css file having imports is with a <link>:
+        ##
+        # https://en.wikibooks.org/w/load.php?debug=false&lang=en&modules=site&only=styles&skin=vector&*
+        ##
+        # Its css file contains several lines like this:
+        ##
+        # @import url(//en.wikibooks.org/w/index.php?title=MediaWiki:Common.css/Autocount.css&action=raw&ctype=text/css) screen;
+        ##
+        # We will extract the url in all @import and save them as style_?.css
+
+        lines = csstext.split(';')
+        for i, ln in enumerate(lines):
+
+            if ln.startswith('@import'):
+
+                logger.debug("{}: @import css line found at line #{}".format(ind, i))
+                ln = ln.split('(')
+                ln = [ln[0], ln[1].split(')')[0], ln[1].split(')')[1]]
+                url = 'https:' + ln[1]
+                (stylename, redirect_path) = self.download_style(baseurl, url, ind)
+
+                logger.debug("Redirect imported style to " + redirect_path)
+                lines[i] = ln[0] + '(' + redirect_path + ')' + ln[-1]
+
+            return ';\n'.join(lines)
+
+    def download_style(self, baseurl, url, ind):
+        '''
+        Download style and update styles buffer. Return (style filename, redirect_path)
+        '''
+        from urllib.request import urlopen
+
+        #    if not url.startswith( url_wiki ):
+        #      print(ind + ':: url not starts with url_wiki("%s"), changing it...'%url_wiki)
+        #      url = urllib.parse.urljoin( url_wiki, url[0]=="/" and url[1:] or url)
+        #      print(ind + ':: New url = '+ url[:20] + '...')
+        url = sureUrl(baseurl, url)
+
+        if url in self.styles:
+            i = self.styles.index(url)
+            stylename = "style_%s.css" % i
+            logger.debug("{} already downloaded as {}".format(url, stylename))
+
+        else:
+            i = len(self.styles)
 
-        logger.info("Downloading: {} load to Page # {}".format(url, len(pages) + 1))
+            # IMPORTANT: append to styles right after i is retrieved
+            self.styles.append(url)
 
+            stylename = "style_%s.css" % i
+            logger.info("Downloading style {} as {}".format(url, stylename))
+
+            try:
+                response = urlopen(url)
+            except urllib.error.HTTPError as e:
+                logger.warning(e)
+                logger.warning("Missing style: {}".format(url))
+                # Keep the url (and its index) so we don't retry it
+                self.failed.append(os.path.join(self.dir_styles_full, stylename))
+                raise e
+
+            # styletext = response.read().decode()
+            try:
+                styletext = response.read().decode(response.headers.get_content_charset())
+                styletext = self.download_imported_style(baseurl, styletext, ind)
+                self.save_style(stylename, styletext, ind)
+            except TypeError:
+                # No content_charset
+                logger.warning("Treating link as 'style': saving {} to {}".format(url, stylename))
+                path = os.path.join(self.dir_styles_full, stylename)
+                blob = response.read()
+                save_blob(path, blob)
+
+        redirect_path = os.path.join('.', stylename)
+        return (stylename, redirect_path)
+
+    def save_style(self, stylename, styletext, ind):
+        '''
+        Called by download_style()
+        '''
+        path = os.path.join(self.dir_styles_full, stylename)
+        logger.debug("{}: Saving style to: {}".format(ind, path))
         try:
-            response = urllib.request.urlopen(url)
+            open(path, "x").write(styletext)
+        except FileExistsError:
+            logger.warning("File exists! appending {}".format(path))
+            open(path, "w+").write(styletext)
+        except OSError as exc:
+            if exc.errno == errno.ENAMETOOLONG:
+                logger.error("Filename too long! Ignoring {}".format(path))
+
+            else:
+                raise  # re-raise previously caught exception
+
+    # ========================================================
+    ##
+    # tag <a...> (Note: imgs are handled within <a>)
+    ##
+    # Go thru each <a>, load page or img as needed
+    # ========================================================
+
+    def handle_tagAs(self, baseurl, soup, ind, depth=0):
+
+        # print(ind + '>>> handle_tagAs(soup)')
+        for a in soup.find_all('a'):
+            href = a.get('href')
+            '''
+            href could be:
+            https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/First_Steps
+            https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/First_Steps/Creating_a_simple_model
+
+            But we save all pages in the folder where the home page is anyway.
+            '''
+
+            if a.string == 'edit':  # Remove [<a...>edit</a>]
+                a.findParents()[0].clear()
+
+            if href:
+                # if href_parts.netloc == url_wiki and href_parts.path.startswith(url_openscadwiki):
+                # if href.startswith(url_wiki + url_openscadwiki):
+                #     href = href[len(url_wiki):]
+
+                if self.in_scope(href):
+
+                    # like: aaa#bbb=> [aaa,bbb]
+                    fnames = href.split("/")[-1].split("#")  # like: aaa#bbb=> [aaa,bbb]
+                    fname  = fnames[0] + ".html"
+                    fnamebranch = fname + (len(fnames) > 1 and ("#" + fnames[1]) or "")
+
+                    url = page_url(href)
+                    local = url in self.pages or url in self.queued
+
+                    if fname == 'Print_version.html':
+                        pass
+                    elif self.max_depth is not None and depth >= self.max_depth and not local:
+                        # Too deep to be saved locally: keep pointing online
+                        a['href'] = sureUrl(urlparse(href).netloc, href)
+                    else:
+                        self.enqueue(url, depth=depth + 1)
+                        a['href'] = fnamebranch
+                        logger.info("{}: Pages: {} -  handle_tagAs queued page {}. New href = {}".format(ind, len(self.pages), os.path.join(self.dir_docs, fname), a.get('href')))
+
+                # hopefully already covered in sameUrl
+                # elif href_parts.path.startswith('/wiki'):
+                #     a['href'] = url_wiki + href
+                elif href.startswith('//'):
+                    a['href'] = 'https:' + href
+
+                if a.img and not a.img['src'].startswith('/static/images'):
+                    # FIXME should do better inspection of the links to handle svg
+    # All imgs are wrapped inside <a>, so download_img() is called when handling <a> (handle_tagAs)
+
+                    try:
+                        imgname = self.download_img(baseurl, soup_a=a, ind=ind)
+                        self.redirect_img(a, imgname, ind)
+                    except urllib.error.HTTPError:
+                        pass
+                    except OSError as exc:
+                        if exc.errno == errno.ENAMETOOLONG:
+                            logger.error("Unable to save the image. ignoring")
+                        else:
+                            raise
+        return soup
+
+    def download_img(self, baseurl, soup_a, ind):
+        '''
+        Download an image in <a...><img ...></a>. Return imgname
+                    soup_a: a BeautifulSoup tag class
+                    ind   : indent for logger
+        '''
+        from urllib.request import urlretrieve
+
+        # print(ind + '>>> download_img(soup_a)')
+        src = sureUrl(baseurl, soup_a.img['src'])
+        #    if src.startswith('//'):
+        #       src = "https:" + src
+        #    elif not src.startswith( url_wiki):
+        #      src = urllib.parse.urljoin( url_wiki, src)
+
+        imgname = src.split("/")[-1]
+
+        # Decode url:
+        #  Some img name contains %28,%29 for "(",")", resp, and %25 for %.
+        imgname = imgname.replace('%28', '(').replace('%29', ')').replace('%25', '%')
 
-            html = response.read()
-            pages.append(url)
+        logger.debug("{}:  Img src: {}".format(ind, src))
 
-            soup = bs(html, 'html.parser')
-            handle_styles(url, soup, ind)
-            soup = handle_tagAs(url, soup, ind)
-            handle_scripts(soup, ind)
+        savepath = os.path.join(self.dir_imgs, imgname)  # local img path
+        if savepath not in self.imgs:
 
-            if url != cheatsheet_url:
-                removeNonOpenSCAD(soup, url)
+            logger.info("Downloading image: " + imgname)
+            try:
+                try:
+                    with open(savepath, 'x'):
+                        pass
+                except FileExistsError:
+                    logger.error("File exists, Overwriting... {}".format(savepath))
+
+                urlretrieve(src, savepath)  # download image
+                self.imgs.append(savepath)
+                logger.debug(ind + "Saved img as: " + savepath)
+            except urllib.error.HTTPError as e:
+                logger.warning("404 image: {}".format(src))
+                raise e
+            except OSError as exc:
+                if exc.errno == errno.ENAMETOOLONG:
+                    logger.error("Filename too long! Ignoring... {}".format(imgname))
+                    self.imgs.append(savepath) # no point in retrying later on either
+                    self.failed.append(savepath)
+                # TODO 
+                # this currently occurs due to the build notification icon etc actually being a link to
+                # an svg file hosted on github - at least on my machine ... ?
+                else:
+                    raise  # re-raise previously caught exception
+
+
+    # Remove srcset that seems to cause problem in some Firefox
+        del soup_a.img['srcset']
+
+        # For debug:
+        # print(ind+ "a.img: "+str(a))
+
+        return imgname
+
+    def redirect_img(self, soup_a, imgname, ind):
+        '''
+        Redirect img src links in soup_a (<a...><img ...></a>) to local path.
+
+                    soup_a: a BeautifulSoup tag class
+                    ind   : indent for logger
+        '''
+        linkurl = os.path.join('.', 'imgs', imgname)  # ./imgs/img.png
+        logger.debug("Img links redirect to: " + linkurl)
+        soup_a.img['src'] = linkurl
+        soup_a['href'] = linkurl
+        logger.debug("Total imgs: " + str(len(self.imgs)))
+
+        # For debug:
+        # print(ind+ "a.img: "+str(a))
+
+    # ========================================================
+    ##
+    # html page --- this is the main function
+    ##
+    # ========================================================
+
+    def handle_page(self, url, depth=0):
+        from urllib.request import urlopen
+
+        # For logger
+        ind = '[' + str(len(self.pages) + 1) + '] '
+        indm = ind + "| "  # for image
+
+        logger.debug("{} handle_page(url='{}', depth={})".format(ind, url, depth))
+        # print ind+ 'Page: ' + href
+
+        url = page_url(url)
+
+        if url not in self.pages:  # url not already downloaded
 
-            fname = url.split("/")[-1].split("#")[0] + ".html"
-            soup.body.append(getFooterSoup(url, fname))
+            logger.info("Downloading: {} load to Page # {}".format(url, len(self.pages) + 1))
 
-            # Save
-            filepath = os.path.join(folder, fname)
-            logger.debug(ind + "Saving: ", filepath)
             try:
-                open(filepath, "x").write(str(soup))
-            except FileExistsError:
-                logger.error("File exists! Overwriting!! {}".format(filepath))
-                open(filepath, "w").write(str(soup))
-            logger.debug(ind + "{} of pages: {} of styles: {} of imgs: ".format(len(pages),
-                                                                                len(styles),
-                                                                                len(imgs)))
-        # '''# for debugging
-        # if len(pages)==94:
-        #     for s in styles:
-        #         print()
-        #         print()
-        #         print(s)
-        # '''
-        except urllib.error.HTTPError:
-            logger.error("404: {}".format(url))
-
-
-handle_page(url=cheatsheet_url)
-populate()
+                response = urlopen(url)
+
+                html = response.read()
+                self.pages.append(url)
+
+                soup = bs(html, 'html.parser')
+                self.handle_styles(url, soup, ind)
+                soup = self.handle_tagAs(url, soup, ind, depth=depth)
+                handle_scripts(soup, ind)
+
+                if url != cheatsheet_url:
+                    removeNonOpenSCAD(soup, url)
+
+                fname = page_filename(url)
+                soup.body.append(getFooterSoup(url, fname))
+
+                # Save
+                filepath = os.path.join(self.dir_docs, fname)
+                logger.debug(ind + "Saving: " + filepath)
+                try:
+                    open(filepath, "x").write(str(soup))
+                except FileExistsError:
+                    logger.error("File exists! Overwriting!! {}".format(filepath))
+                    open(filepath, "w").write(str(soup))
+                logger.debug(ind + "{} of pages: {} of styles: {} of imgs: ".format(len(self.pages),
+                                                                                    len(self.styles),
+                                                                                    len(self.imgs)))
+            # '''# for debugging
+            # if len(pages)==94:
+            #     for s in styles:
+            #         print()
+            #         print()
+            #         print(s)
+            # '''
+            except urllib.error.HTTPError:
+                logger.error("404: {}".format(url))
+
+
+# ========================================================
+##
+# command line
+##
+# ========================================================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Download OpenSCAD online doc for offline reading")
+    parser.add_argument('command', nargs='?', default='crawl',
+                        choices=['crawl', 'status', 'verify'],
+                        help="crawl the docs (default), or report on / check a previous crawl")
+    parser.add_argument('-o', '--output-dir', default=dir_docs,
+                        help="where pages are saved (default: %(default)s)")
+    parser.add_argument('--seed', action='append', dest='seeds', metavar='URL',
+                        help="page to start from, can be repeated (default: %s)" % cheatsheet_url)
+    parser.add_argument('--scope-path', action='append', dest='scope_paths', metavar='PATH',
+                        help="follow links whose path starts with PATH (default: %s)" % url_openscadwiki)
+    parser.add_argument('--scope-netloc', action='append', dest='scope_netlocs', metavar='HOST',
+                        help="follow links to HOST (default: %s)" % urlparse(url_openscadorg).netloc)
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="how many links away from a seed to follow (default: no limit)")
+    parser.add_argument('--refetch', action='store_true', default=HAMMERTIME,
+                        help="ignore the buffers of a previous crawl and download everything again")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="log debug messages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.verbose and logging.DEBUG or logging.INFO)
+
+    kwargs = {}
+    if args.seeds: kwargs['seed_urls'] = args.seeds
+    if args.scope_paths: kwargs['scope_paths'] = args.scope_paths
+    if args.scope_netlocs: kwargs['scope_netlocs'] = args.scope_netlocs
+    crawler = Crawler(output_dir=args.output_dir, max_depth=args.max_depth,
+                      resume=not args.refetch, **kwargs)
+
+    if args.command == 'status':
+        for k, n in sorted(crawler.status().items()):
+            print("{}= {}".format(k, n))
+        return 0
+
+    if args.command == 'verify':
+        missing = crawler.verify()
+        for path in missing:
+            print("missing: " + path)
+        return missing and 1 or 0
+
+    print("\n[Local]")
+    print("this_dir= " + this_dir)
+    print("dir_docs= " + crawler.dir_docs)
+    print("dir_imgs= " + crawler.dir_imgs)
+    print("dir_styles= " + dir_styles)
+    print("dir_styles_full= " + crawler.dir_styles_full)
+    print("cheatsheet page= " + offline_cheatsheet)
+    print()
+
+    crawler.crawl()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
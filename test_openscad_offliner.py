@@ -0,0 +1,131 @@
+import os
+import pickle
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+import openscad_offliner
+from openscad_offliner import Crawler, main
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+url_manual = 'https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/'
+
+
+def write_buffers(folder, pages=(), imgs=(), styles=()):
+    with open(os.path.join(folder, openscad_offliner.buffers_name), 'wb') as f:
+        pickle.dump({'pages': list(pages), 'imgs': list(imgs), 'styles': list(styles)}, f)
+
+
+def test_import_has_no_side_effects(tmp_path):
+    code = ("import sys, openscad_offliner; "
+            "sys.stderr.write(repr(('bs4' in sys.modules, 'urllib.request' in sys.modules)))")
+    env = dict(os.environ, PYTHONPATH=this_dir)
+    proc = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert proc.returncode == 0
+    assert proc.stdout == ''
+    assert proc.stderr == '(False, False)'
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_status_is_repeatable(tmp_path):
+    write_buffers(str(tmp_path), pages=[url_manual + 'A'], styles=['https://x/s.css'])
+    crawler = Crawler(output_dir=str(tmp_path))
+    expected = {'pages': 1, 'imgs': 0, 'styles': 1}
+    assert crawler.status() == expected
+    assert crawler.status() == expected
+    assert crawler.pages == []
+
+
+def test_verify_reports_missing_files(tmp_path):
+    folder = str(tmp_path)
+    write_buffers(folder, pages=[url_manual + 'A#x', url_manual + 'B'],
+                  imgs=['openscad_docs/imgs/a.png'], styles=['https://x/s.css'])
+    open(os.path.join(folder, 'A.html'), 'w').close()
+    crawler = Crawler(output_dir=folder)
+    expected = [os.path.join(folder, 'B.html'),
+                os.path.join(folder, 'imgs', 'a.png'),
+                os.path.join(folder, 'styles', 'style_0.css')]
+    assert crawler.verify() == expected
+    assert crawler.verify() == expected
+
+
+def test_main_status(tmp_path, capsys):
+    assert main(['status', '-o', str(tmp_path)]) == 0
+    assert 'pages= 0' in capsys.readouterr().out
+
+
+class FakeResponse(object):
+
+    def __init__(self, html):
+        self.html = html
+
+    def read(self):
+        return self.html.encode()
+
+
+def test_depth_limited_crawl(tmp_path, monkeypatch):
+    pytest.importorskip('bs4')
+
+    # S -> A, B;  A -> B#sec;  B -> C;  C -> B#sec, D#sec
+    links = {'S': ['A', 'B'], 'A': ['B#sec'], 'B': ['C'], 'C': ['B#sec', 'D#sec'], 'D': []}
+    fetched = []
+
+    def urlopen(url):
+        name = url.split('/')[-1]
+        fetched.append(name)
+        body = ''.join('<a href="/wiki/OpenSCAD_User_Manual/%s">%s</a>' % (n, n)
+                       for n in links[name])
+        return FakeResponse('<html><head></head><body><div id="content">%s</div></body></html>'
+                            % body)
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    folder = str(tmp_path)
+    crawler = Crawler(seed_urls=[url_manual + 'S'], output_dir=folder, max_depth=2)
+    crawler.crawl()
+
+    assert fetched == ['S', 'A', 'B', 'C']
+    with open(os.path.join(folder, 'C.html')) as f:
+        saved = f.read()
+    assert 'href="B.html#sec"' in saved
+    assert 'href="%sD#sec"' % url_manual in saved
+    assert crawler.status() == {'pages': 4, 'imgs': 0, 'styles': 0}
+    assert crawler.verify() == []
+
+
+def test_verify_skips_failed_style(tmp_path, monkeypatch):
+    pytest.importorskip('bs4')
+
+    def urlopen(url):
+        if '/load.php?' in url:
+            raise urllib.error.HTTPError(url, 404, 'Not Found', {}, None)
+        return FakeResponse('<html><head><link rel="stylesheet" href="/w/load.php?only=styles">'
+                            '</head><body><div id="content"></div></body></html>')
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    crawler = Crawler(seed_urls=[url_manual + 'S'], output_dir=str(tmp_path))
+    crawler.crawl()
+
+    assert crawler.status() == {'pages': 1, 'imgs': 0, 'styles': 1}
+    assert crawler.verify() == []
+    assert main(['verify', '-o', str(tmp_path)]) == 0
+
+
+def test_crawl_again_without_resume(tmp_path, monkeypatch):
+    pytest.importorskip('bs4')
+    fetched = []
+
+    def urlopen(url):
+        fetched.append(url.split('/')[-1])
+        return FakeResponse('<html><head></head><body><div id="content"></div></body></html>')
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    crawler = Crawler(seed_urls=[url_manual + 'S'], output_dir=str(tmp_path), resume=False)
+    crawler.crawl()
+    crawler.crawl()
+
+    assert fetched == ['S', 'S']
+    assert crawler.pages == [url_manual + 'S']